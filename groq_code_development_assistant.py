@@ -1,47 +1,292 @@
 import os
+import re
+import sys
 import json
+import math
+import socket
+import argparse
+import tempfile
+import socketserver
+import stat
 import requests
 import questionary
 import inquirer
 import httpx
 from bs4 import BeautifulSoup
-from aider.coders import Coder
-from aider.models import Model
 from rich.console import Console
 from rich.prompt import Prompt
-from chromadb import Client
-from chromadb.config import Settings
 import hashlib
-import torch
-from transformers import RobertaTokenizer, RobertaModel
+import heapq
+import threading
+import time
+import uuid
+from collections import Counter, deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from watchdog.events import FileSystemEventHandler
+from watchdog.observers import Observer
 
 console = Console()
 
-# Initialize ChromaDB client
-db = Client(Settings())
-files_collection = db.create_collection("files")
-urls_collection = db.create_collection("urls")
+# Messages from background threads held back while the user is answering a prompt
+background_output = {"held": 0, "messages": [], "lock": threading.Lock()}
+
+# ChromaDB client and collections, created by load_resources()
+db = None
+files_collection = None
+urls_collection = None
+
+# CodeBERT model and tokenizer, loaded by load_resources()
+tokenizer = None
+model = None
+resources_lock = threading.Lock()
+
+# Serializes changes to the vector store and lexical indexes across threads
+index_lock = threading.RLock()
+
+# Pooled HTTP connections shared by all API and scraping requests
+http_session = requests.Session()
+
+# Seconds to wait on a chat completion and on fetching a URL before giving up
+CHAT_REQUEST_TIMEOUT = 120
+SCRAPE_TIMEOUT = 30
+
+# Unix domain socket of the resident daemon, see serve_daemon() and default_daemon_socket_path()
+DAEMON_SOCKET_PATH = os.getenv("ASSISTANT_DAEMON_SOCKET")
+# The session ID scopes this client's file selection in a daemon shared with other shells
+daemon_state = {"socket_path": None, "session_id": uuid.uuid4().hex}
+
+# Groq models eligible for each task, in order of preference; see select_model()
+MODEL_ROUTES = {
+    "chat": ["llama3-8b-8192", "llama-3.1-8b-instant"],
+    "conventions": ["llama3-8b-8192", "llama-3.1-8b-instant"],
+    "consensus": ["llama3-70b-8192", "llama-3.3-70b-versatile", "llama-3.1-8b-instant"],
+    "aider": ["llama3-70b-8192"],
+    "architect": ["llama3-8b-8192"],
+    "editor": ["llama3-8b-8192"],
+}
+MODEL_CONTEXT_WINDOWS = {
+    "llama3-8b-8192": 8192,
+    "llama3-70b-8192": 8192,
+    "llama-3.1-8b-instant": 131072,
+    "llama-3.3-70b-versatile": 131072,
+}
+# Seconds a task may take at the median before a slower-to-answer model is passed over
+TASK_LATENCY_BUDGETS = {
+    "chat": 10.0,
+    "conventions": 5.0,
+    "consensus": 30.0,
+}
+RESPONSE_TOKEN_RESERVE = 1024
+
+# Rolling per-model request latencies, see record_model_latency()
+LATENCY_WINDOW = 50
+MIN_LATENCY_SAMPLES = 5
+# Samples older than this are ignored, so a model skipped for being slow is retried later
+LATENCY_MAX_AGE = 300.0
+model_latencies = {}
+latency_lock = threading.Lock()
+
+# Send a duplicate request when the first exceeds the model's p95 latency
+HEDGE_REQUESTS = os.getenv("ASSISTANT_HEDGE_REQUESTS", "0") == "1"
+hedge_pool = ThreadPoolExecutor(max_workers=4)
+
+# Number of stored files and of URLs retrieved into each conflict-resolution prompt.
+# The budgets are separate so scraped pages never crowd out the selected files.
+CONTEXT_FILES_K = 8
+CONTEXT_URLS_K = 3
+
+# Number of stored embeddings fetched per request when ranking a session's documents
+EMBEDDING_PAGE_SIZE = 256
+
+# In-memory BM25 indexes mirroring the ChromaDB collections, keyed by collection name
+lexical_indexes = {}
+
+# Content hashes of indexed files, keyed by document ID, to skip re-embedding unchanged files
+indexed_file_hashes = {}
+
+# Background file watcher state, see start_file_watcher()
+watch_state = {
+    "observer": None,
+    "handler": None,
+    "directories": {},
+    "selections": {},
+    "session_pids": {},
+    "pending": {},
+    "moves": {},
+    "last_event": 0.0,
+    "busy": False,
+    "condition": threading.Condition(),
+}
+
+# Long-lived Aider Coder instances, keyed by project root
+aider_sessions = {}
+
+# Splits identifiers and dotted/dashed paths, then camelCase/PascalCase words
+IDENTIFIER_PATTERN = re.compile(r"[A-Za-z0-9_]+(?:[.\-][A-Za-z0-9_]+)*")
+CAMEL_CASE_PATTERN = re.compile(r"[A-Z]+(?=[A-Z][a-z]|\d|\b)|[A-Z]?[a-z]+|[A-Z]+|\d+")
+
+# Prompt prefix reuse across Groq requests, see record_prefix_reuse()
+PREFIX_HISTORY_SIZE = 16
+prefix_stats = {
+    "requests": 0,
+    "prompt_chars": 0,
+    "reused_chars": 0,
+    "prompt_tokens": 0,
+    "cached_tokens": 0,
+    "recent_prompts": [],
+}
+
+# Static prompt text, kept byte-identical between requests so it forms a cacheable prefix
+CONVENTIONS_SYSTEM_PROMPT = """
+    You are an assistant helping to create a coding conventions document.
+    Based on the task description given by the user, generate a CONVENTIONS.md file
+    in the following format:
+
+    ```
+    # Coding Conventions
+
+    - **Task Context:** [Brief description of the task or feature]
+    - **HTTP Library:** [Preferred library for HTTP requests]
+    - **Type Annotations:** [Whether to use type hints or not]
+    - **Code Formatting:** [Formatting style, e.g., PEP 8, Google Style]
+    - **Error Handling:** [How errors should be handled, e.g., custom exceptions]
+    - **Sensitive Files:** [List of sensitive files that should not be modified]
+
+    Add any additional relevant best practices or guidelines specific to the task.
+    Ensure the output is concise and formatted properly for a markdown file.
+    ```
+    """
+
+CONFLICT_RESOLUTION_PROCESS = (
+    "David, as the leader, guides the team through a step-by-step process to resolve the issue "
+    "in the given context file. The goal is to foster collaboration among the team members, "
+    "ensuring clarity and structure, and allowing for a consensus on a technical solution that "
+    "addresses all perspectives. The process is:\n\n"
+    "1) Gather All Perspectives: David summarizes each persona's viewpoint.\n"
+    "2) Identify the Core Issue: Examine the context file to determine the root cause.\n"
+    "3) Brainstorm Solutions: Team members offer potential solutions.\n"
+    "4) Discuss and Refine: Collaborate and refine the ideas.\n"
+    "5) Reach Consensus: Arrive at a balanced, feasible technical solution.\n"
+    "6) Record the Action Plan: Document the steps everyone agrees to.\n\n"
+    "7) Display Sudo Code and steps to resolve the issue.\n\n"
+    "Please provide a structured, supportive response guiding the team through these steps."
+)
+
+# Generic pseudoscript outlining best software development steps
+PSEUDOSCRIPT = (
+    "1. **Planning**: Define the project scope, objectives, and requirements.\n"
+    "2. **Design**: Create architectural and detailed design documents.\n"
+    "3. **Development**: Implement the design using {subject}.\n"
+    "4. **Testing**: Develop and execute test cases to ensure functionality.\n"
+    "5. **Deployment**: Deploy the system to the target environment.\n"
+    "6. **Maintenance**: Monitor and maintain the system post-deployment."
+    "Please follow the Best Software Development Steps outlined above."
+)
+
+def print_background(message):
+    """
+    Print a message from a background thread without drawing over an open prompt.
+
+    Args:
+        message (str): The rich-formatted message.
+    """
+    with background_output["lock"]:
+        if background_output["held"]:
+            background_output["messages"].append(message)
+            return
+    console.print(message)
+
+def hold_background_output():
+    """
+    Buffer background messages until release_background_output() is called.
+    """
+    with background_output["lock"]:
+        background_output["held"] += 1
+
+def release_background_output():
+    """
+    Stop buffering background messages and print the ones held back.
+    """
+    with background_output["lock"]:
+        background_output["held"] -= 1
+        if background_output["held"]:
+            return
+        messages = background_output["messages"]
+        background_output["messages"] = []
+    for message in messages:
+        console.print(message)
+
+def get_aider_session(project_root=None):
+    """
+    Return the long-lived Aider session for a project, creating it on first use.
+
+    Reusing the Coder keeps Aider's repo map and chat history warm across issues, so
+    follow-up questions skip the cold start.
 
-# Load CodeBERT model and tokenizer
-tokenizer = RobertaTokenizer.from_pretrained("microsoft/codebert-base")
-model = RobertaModel.from_pretrained("microsoft/codebert-base")
+    Args:
+        project_root (str): The project directory. Defaults to the current working directory.
 
-def ask_aider_about_issue(issue_description, files):
+    Returns:
+        Coder: The Aider Coder instance for the project.
+    """
+    project_root = os.path.abspath(project_root or os.getcwd())
+    coder = aider_sessions.get(project_root)
+    if coder is None:
+        from aider.coders import Coder
+        from aider.models import Model
+
+        # Initialize the model (e.g., 'groq/llama3-70b-8192')
+        model = Model(f"groq/{select_model('aider')}")
+
+        # Start without files; they are seeded per issue from the vector store
+        coder = Coder.create(main_model=model, fnames=[])
+        aider_sessions[project_root] = coder
+    return coder
+
+def select_relevant_files(issue_description, files, top_k=5):
+    """
+    Pick the files most relevant to an issue using the hybrid search index.
+
+    Args:
+        issue_description (str): Description of the task or issue.
+        files (list): Candidate file paths.
+        top_k (int): The maximum number of files to return.
+
+    Returns:
+        list: The top-ranked file paths, or all candidate files if none are indexed.
+    """
+    # Indexed paths are absolute; results are scoped to this session, so a file the
+    # watcher followed through a rename comes back under its new path
+    files_by_path = {os.path.abspath(path): path for path in files}
+    results = call_resource("search", query=issue_description, files=files, urls=[], k=top_k, collection_names=["files"])
+    ranked_files = [
+        files_by_path.get(result['metadata']['path'], result['metadata']['path']) for result in results
+    ]
+    return ranked_files or files
+
+def ask_aider_about_issue(issue_description, files, top_k=5):
     """
     Interact with Aider to inquire about a specific issue.
 
+    The project's Aider session is reused between calls and only the files ranked most
+    relevant to the issue are kept in the chat.
+
     Args:
         issue_description (str): Description of the task or issue.
-        files (list): List of file paths to include in the chat session.
+        files (list): List of file paths to choose the chat session files from.
+        top_k (int): The maximum number of files to add to the chat session.
 
     Returns:
         str: Aider's response regarding the issue.
     """
-    # Initialize the model (e.g., 'groq/llama3-70b-8192')
-    model = Model("groq/llama3-70b-8192")
+    coder = get_aider_session()
 
-    # Create a Coder instance with the specified model and files
-    coder = Coder.create(main_model=model, fnames=files)
+    # Swap the chat files for the ones most relevant to this issue
+    wanted_fnames = {coder.abs_root_path(path) for path in select_relevant_files(issue_description, files, top_k)}
+    for fname in set(coder.abs_fnames) - wanted_fnames:
+        coder.drop_rel_fname(coder.get_rel_fname(fname))
+    for fname in wanted_fnames - set(coder.abs_fnames):
+        coder.add_rel_fname(coder.get_rel_fname(fname))
 
     # Send the issue description to Aider and get the response
     response = coder.run(issue_description)
@@ -160,26 +405,95 @@ def prompt_for_sensitive_files():
         f.write('\n'.join(f"--read {file}" for file in all_sensitive_files))
     return all_sensitive_files
 
-def send_message(user_message, api_key):
+def build_messages(system_prompt, user_message, history=None):
     """
-    Sends a message to the OpenAI API and retrieves the assistant's reply.
+    Build a chat message list with the static system prompt first.
+
+    Keeping the static text in a leading system message, followed by earlier turns in
+    order, gives consecutive requests a long byte-identical prefix that providers can cache.
 
     Args:
-        user_message (str): The message to send to the assistant.
+        system_prompt (str): The static instructions, or None to omit the system message.
+        user_message (str): The content of the new user turn.
+        history (list): Earlier user/assistant messages of the conversation.
+
+    Returns:
+        list: The messages to send to the chat completions API.
+    """
+    messages = []
+    if system_prompt:
+        messages.append({"role": "system", "content": system_prompt})
+    messages.extend(history or [])
+    messages.append({"role": "user", "content": user_message})
+    return messages
+
+def record_prefix_reuse(messages, response_json):
+    """
+    Record how much of a request's prompt repeats the prefix of a recent request.
+
+    The character-level prefix shared with the most similar of the last
+    PREFIX_HISTORY_SIZE prompts is tracked, along with the cached token count when the
+    provider reports one in its usage data.
+
+    Args:
+        messages (list): The messages that were sent.
+        response_json (dict): The decoded API response.
+    """
+    serialized = json.dumps(messages)
+    recent_prompts = prefix_stats["recent_prompts"]
+    reused_chars = max(
+        (len(os.path.commonprefix([serialized, previous])) for previous in recent_prompts),
+        default=0
+    )
+
+    usage = response_json.get('usage') or {}
+    prompt_tokens_details = usage.get('prompt_tokens_details') or {}
+
+    prefix_stats["requests"] += 1
+    prefix_stats["prompt_chars"] += len(serialized)
+    prefix_stats["reused_chars"] += reused_chars
+    prefix_stats["prompt_tokens"] += usage.get('prompt_tokens', 0)
+    prefix_stats["cached_tokens"] += prompt_tokens_details.get('cached_tokens', 0)
+
+    recent_prompts.append(serialized)
+    del recent_prompts[:-PREFIX_HISTORY_SIZE]
+
+def report_prefix_reuse():
+    """
+    Print a summary of prompt prefix reuse across the requests made so far.
+    """
+    if not prefix_stats["requests"]:
+        return
+
+    reuse_ratio = prefix_stats["reused_chars"] / max(prefix_stats["prompt_chars"], 1)
+    console.print(
+        f"[bold blue]Prompt prefix reuse:[/bold blue] {reuse_ratio:.0%} of "
+        f"{prefix_stats['prompt_chars']} characters over {prefix_stats['requests']} requests"
+    )
+    if prefix_stats["cached_tokens"]:
+        console.print(
+            f"[bold blue]Provider cached tokens:[/bold blue] {prefix_stats['cached_tokens']} of "
+            f"{prefix_stats['prompt_tokens']} prompt tokens"
+        )
+
+def request_chat_completion(messages, api_key, model):
+    """
+    Send messages to the Groq chat completions API over the pooled HTTP session.
+
+    Args:
+        messages (list): The messages to send, see build_messages().
         api_key (str): The API key for authenticating the request.
+        model (str): The model to use.
 
     Returns:
-        str: The assistant's reply.
+        dict: The decoded API response.
 
     Raises:
         requests.exceptions.HTTPError: If the HTTP request returned an unsuccessful status code.
-
-    The function sends a POST request to the OpenAI API with the user's message and API key.
-    It then processes the response to extract the assistant's reply, prints it, and writes it to a file named 'prompt.txt'.
     """
     payload = {
-        "model": "llama3-8b-8192",
-        "messages": [{"role": "user", "content": user_message}]
+        "model": model,
+        "messages": messages
     }
 
     headers = {
@@ -187,15 +501,196 @@ def send_message(user_message, api_key):
         "Content-Type": "application/json"
     }
 
-    response = requests.post(
+    response = http_session.post(
         "https://api.groq.com/openai/v1/chat/completions",
         headers=headers,
-        data=json.dumps(payload)
+        data=json.dumps(payload),
+        timeout=CHAT_REQUEST_TIMEOUT
     )
 
     response.raise_for_status()
 
-    response_json = response.json()
+    return response.json()
+
+def estimate_tokens(messages):
+    """
+    Roughly estimate the prompt tokens of a message list, at about four characters per token.
+
+    Args:
+        messages (list): The chat messages.
+
+    Returns:
+        int: The estimated token count.
+    """
+    return sum(len(message["content"]) // 4 + 4 for message in messages)
+
+def record_model_latency(model, seconds):
+    """
+    Record the latency of a completed request in the model's rolling window.
+
+    Samples are timestamped so latency_percentile() can ignore ones older than LATENCY_MAX_AGE.
+
+    Args:
+        model (str): The model that served the request.
+        seconds (float): How long the request took.
+    """
+    with latency_lock:
+        model_latencies.setdefault(model, deque(maxlen=LATENCY_WINDOW)).append((time.monotonic(), seconds))
+
+def latency_percentile(model, percentile):
+    """
+    Return a percentile of the model's recent request latencies.
+
+    Only samples from the last LATENCY_MAX_AGE seconds count. Once a slow model's samples
+    expire it has no percentile again, so select_model() sends it traffic and measures it anew.
+
+    Args:
+        model (str): The model name.
+        percentile (float): The percentile, between 0 and 100.
+
+    Returns:
+        float: The latency in seconds, or None if too few recent requests have been observed.
+    """
+    cutoff = time.monotonic() - LATENCY_MAX_AGE
+    with latency_lock:
+        samples = sorted(seconds for recorded_at, seconds in model_latencies.get(model, []) if recorded_at >= cutoff)
+    if len(samples) < MIN_LATENCY_SAMPLES:
+        return None
+    rank = math.ceil(percentile / 100 * len(samples)) - 1
+    return samples[max(rank, 0)]
+
+def select_model(task, messages=None):
+    """
+    Pick the Groq model for a task from the prompt size and observed latencies.
+
+    Models too small for the estimated prompt plus RESPONSE_TOKEN_RESERVE are skipped. Of
+    the rest, the first in MODEL_ROUTES order whose median latency is within the task's
+    budget is used; if none is, the one with the lowest median latency is used instead.
+
+    Args:
+        task (str): The task type, a key of MODEL_ROUTES.
+        messages (list): The chat messages, if known, to size the prompt.
+
+    Returns:
+        str: The model name, without the 'groq/' provider prefix.
+    """
+    routes = MODEL_ROUTES[task]
+    needed_tokens = estimate_tokens(messages) + RESPONSE_TOKEN_RESERVE if messages else 0
+    candidates = [model for model in routes if MODEL_CONTEXT_WINDOWS.get(model, 0) >= needed_tokens]
+    if not candidates:
+        # Nothing fits; the largest context window truncates the least
+        return max(routes, key=lambda model: MODEL_CONTEXT_WINDOWS.get(model, 0))
+
+    budget = TASK_LATENCY_BUDGETS.get(task)
+    if budget is None:
+        return candidates[0]
+
+    medians = {model: latency_percentile(model, 50) for model in candidates}
+    for model in candidates:
+        if medians[model] is None or medians[model] <= budget:
+            return model
+    return min(candidates, key=lambda model: medians[model])
+
+def hedged_call(func, hedge_after):
+    """
+    Call func, starting a duplicate call if the first has not finished after hedge_after seconds.
+
+    Whichever call succeeds first wins; the other is left to finish in the background.
+
+    Args:
+        func (callable): The call to make, without arguments.
+        hedge_after (float): Seconds to wait before hedging, or None to never hedge.
+
+    Returns:
+        The result of the first successful call.
+
+    Raises:
+        Exception: The error of the last call to fail, if both fail.
+    """
+    first = hedge_pool.submit(func)
+    if hedge_after is None:
+        return first.result()
+
+    done, _ = wait([first], timeout=hedge_after)
+    if done:
+        return first.result()
+
+    futures = [first, hedge_pool.submit(func)]
+    while True:
+        done, _ = wait(futures, return_when=FIRST_COMPLETED)
+        for future in done:
+            futures.remove(future)
+            if future.exception() is None or not futures:
+                return future.result()
+
+def post_chat_completion(messages, api_key, task="chat"):
+    """
+    Send messages to the Groq chat completions API, via the daemon when one is running.
+
+    The model is chosen by select_model(). With ASSISTANT_HEDGE_REQUESTS=1, a duplicate
+    request is sent when the first one exceeds the model's p95 latency.
+
+    Args:
+        messages (list): The messages to send, see build_messages().
+        api_key (str): The API key for authenticating the request.
+        task (str): The task type used to route the request, a key of MODEL_ROUTES.
+
+    Returns:
+        dict: The decoded API response. Prefix reuse is recorded for every response.
+
+    Raises:
+        requests.exceptions.HTTPError: If the HTTP request returned an unsuccessful status code.
+    """
+    model = select_model(task, messages)
+
+    def timed_request():
+        started = time.monotonic()
+        if daemon_state["socket_path"]:
+            # The daemon uses its own API key, so the user's key never leaves this process
+            response_json = call_resource("chat", messages=messages, model=model)
+        else:
+            response_json = request_chat_completion(messages, api_key, model)
+        record_model_latency(model, time.monotonic() - started)
+        return response_json
+
+    hedge_after = latency_percentile(model, 95) if HEDGE_REQUESTS else None
+    response_json = hedged_call(timed_request, hedge_after)
+    record_prefix_reuse(messages, response_json)
+    return response_json
+
+def report_model_latencies():
+    """
+    Print the rolling p50/p99 latency of every model used so far.
+    """
+    with latency_lock:
+        models = sorted(model_latencies)
+    for model in models:
+        p50 = latency_percentile(model, 50)
+        p99 = latency_percentile(model, 99)
+        if p50 is None:
+            continue
+        console.print(f"[bold blue]{model} latency:[/bold blue] p50 {p50:.2f}s, p99 {p99:.2f}s")
+
+def send_message(user_message, api_key, system_prompt=None, history=None):
+    """
+    Sends a message to the OpenAI API and retrieves the assistant's reply.
+
+    Args:
+        user_message (str): The message to send to the assistant.
+        api_key (str): The API key for authenticating the request.
+        system_prompt (str): Static instructions sent ahead of the conversation.
+        history (list): Earlier user/assistant messages of the conversation.
+
+    Returns:
+        str: The assistant's reply.
+
+    Raises:
+        requests.exceptions.HTTPError: If the HTTP request returned an unsuccessful status code.
+
+    The function sends a POST request to the OpenAI API with the user's message and API key.
+    It then processes the response to extract the assistant's reply, prints it, and writes it to a file named 'prompt.txt'.
+    """
+    response_json = post_chat_completion(build_messages(system_prompt, user_message, history), api_key)
     assistant_reply = response_json['choices'][0]['message']['content']
     print("Assistant:", assistant_reply)
     with open("prompt.txt", "w") as f:
@@ -222,54 +717,22 @@ def generate_conventions_md(task_description, intent):
     """
     api_key = os.getenv("GROQ_API_KEY")
     if not api_key:
-        print("Error: GROQ_API_KEY is not set. Please export your API key.")
+        print_background("[bold red]Error: GROQ_API_KEY is not set. Please export your API key.[/bold red]")
         return
 
-    # Define a structured prompt for the LLM
-    prompt = f"""
-    You are an assistant helping to create a coding conventions document.
-    Based on the task description: "{task_description}", generate a CONVENTIONS.md file
-    in the following format:
+    # The format instructions are static; only the task description varies
+    prompt = f'Task description: "{task_description}"'
 
-    ```
-    # Coding Conventions
-
-    - **Task Context:** [Brief description of the task or feature]
-    - **HTTP Library:** [Preferred library for HTTP requests]
-    - **Type Annotations:** [Whether to use type hints or not]
-    - **Code Formatting:** [Formatting style, e.g., PEP 8, Google Style]
-    - **Error Handling:** [How errors should be handled, e.g., custom exceptions]
-    - **Sensitive Files:** [List of sensitive files that should not be modified]
-
-    Add any additional relevant best practices or guidelines specific to the task.
-    Ensure the output is concise and formatted properly for a markdown file.
-    ```
-    """
-
-    payload = {
-        "model": "llama3-8b-8192",
-        "messages": [{"role": "user", "content": prompt}]
-    }
-
-    headers = {
-        "Authorization": f"Bearer {api_key}",
-        "Content-Type": "application/json"
-    }
-
-    response = requests.post(
-        "https://api.groq.com/openai/v1/chat/completions",
-        headers=headers,
-        data=json.dumps(payload)
-    )
+    try:
+        response_json = post_chat_completion(build_messages(CONVENTIONS_SYSTEM_PROMPT, prompt), api_key, "conventions")
+    except requests.exceptions.HTTPError as e:
+        print_background(f"[bold red]Error: Received an error from the API: {e}[/bold red]")
+        return
 
-    if response.status_code == 200:
-        response_json = response.json()
-        llm_reply = response_json['choices'][0]['message']['content']
-        with open('CONVENTIONS.md', 'w') as file:
-            file.write(llm_reply.strip())
-        print("CONVENTIONS.md has been generated.")
-    else:
-        print(f"Error: Received status code {response.status_code} from the API.")
+    llm_reply = response_json['choices'][0]['message']['content']
+    with open('CONVENTIONS.md', 'w') as file:
+        file.write(llm_reply.strip())
+    print_background("[bold green]CONVENTIONS.md has been generated.[/bold green]")
 
 def generate_detailed_prompt(action, focus, subject, context, role="senior software developer"):
     """
@@ -346,8 +809,8 @@ def generate_aider_command():
         "aider",
         "$(cat files.txt)",
         "--architect",
-        "--model", "groq/llama3-8b-8192",
-        "--editor-model", "groq/llama3-8b-8192",
+        "--model", f"groq/{select_model('architect')}",
+        "--editor-model", f"groq/{select_model('editor')}",
         "--message-file", "prompt.txt",
         "--read", "CONVENTIONS.md",
         "$(cat sensitive_files.txt)"
@@ -364,7 +827,7 @@ def scrape_url_content(url):
     Returns:
         str: The scraped text content.
     """
-    response = requests.get(url)
+    response = http_session.get(url, timeout=SCRAPE_TIMEOUT)
     soup = BeautifulSoup(response.content, 'html.parser')
     return soup.get_text()
 
@@ -420,8 +883,36 @@ def read_code_file(file_path):
         print(f"An error occurred while reading the file: {str(e)}")
         return None
 
+def load_resources():
+    """
+    Load the CodeBERT model and tokenizer and create the ChromaDB collections.
+
+    The heavy imports happen here rather than at module import, so a client talking to
+    the daemon never pays for them. Safe to call repeatedly and from several threads.
+    """
+    global db, files_collection, urls_collection, tokenizer, model
+    with resources_lock:
+        if model is not None:
+            return
+
+        from chromadb import Client
+        from chromadb.config import Settings
+        from transformers import RobertaTokenizer, RobertaModel
+
+        # Initialize ChromaDB client
+        db = Client(Settings())
+        files_collection = db.get_or_create_collection("files")
+        urls_collection = db.get_or_create_collection("urls")
+
+        # Load CodeBERT model and tokenizer
+        tokenizer = RobertaTokenizer.from_pretrained("microsoft/codebert-base")
+        model = RobertaModel.from_pretrained("microsoft/codebert-base")
+
 def vectorize_code(content):
     """Vectorize code content using CodeBERT."""
+    import torch
+
+    load_resources()
     inputs = tokenizer(content, return_tensors='pt', padding=True, truncation=True)
     with torch.no_grad():
         outputs = model(**inputs)
@@ -448,49 +939,328 @@ def dump_to_chroma(file_path, db_client):
     # Upsert data into ChromaDB
     db_client.collection("your_collection_name").upsert(document_data)
 
-def store_files_and_urls_in_db(files, urls):
+def tokenize_code(text):
     """
-    Store the files and URLs in the ChromaDB database with unique IDs.
+    Tokenize text for lexical search, splitting code identifiers into their parts.
+
+    The full identifier is always kept so exact matches on function names, error codes
+    and config keys rank highest. Its dotted-path components are added whole, then their
+    snake_case and camelCase parts, so partial queries still match.
 
     Args:
-        files (list): List of file paths.
-        urls (list): List of URLs.
+        text (str): The text to tokenize.
+
+    Returns:
+        list: A list of lowercase tokens.
     """
-    # Process files
-    for file_path in files:
-        try:
-            with open(file_path, 'r') as f:
-                file_content = f.read()
+    tokens = []
+    for match in IDENTIFIER_PATTERN.finditer(text):
+        identifier = match.group(0)
+        tokens.append(identifier.lower())
+
+        # Keep each dotted/dashed component whole so e.g. 'store_file_in_db' in
+        # 'self.store_file_in_db' is a token of its own
+        components = [component for component in re.split(r"[.\-]+", identifier) if component]
+        if len(components) > 1:
+            tokens.extend(component.lower() for component in components)
+
+        for component in components:
+            parts = [part for part in component.split("_") if part]
+            if len(parts) > 1:
+                tokens.extend(part.lower() for part in parts)
+
+            for part in parts:
+                words = CAMEL_CASE_PATTERN.findall(part)
+                if len(words) > 1:
+                    tokens.extend(word.lower() for word in words)
+    return tokens
+
+def get_lexical_index(collection_name):
+    """
+    Return the BM25 index for a collection, creating an empty one if needed.
+
+    Args:
+        collection_name (str): The name of the ChromaDB collection.
+
+    Returns:
+        dict: The index, with 'postings' (term -> {doc_id: term frequency}),
+              'doc_terms' (doc_id -> Counter), 'doc_lengths' and 'total_length' entries,
+              and a 'version' counter bumped on every change.
+    """
+    return lexical_indexes.setdefault(collection_name, {
+        "postings": {},
+        "doc_terms": {},
+        "doc_lengths": {},
+        "total_length": 0,
+        "version": 0,
+    })
+
+def remove_from_lexical_index(collection_name, doc_id):
+    """
+    Remove a document from the BM25 index of a collection.
+
+    Args:
+        collection_name (str): The name of the ChromaDB collection.
+        doc_id (str): The ID of the document to remove.
+    """
+    index = get_lexical_index(collection_name)
+    term_counts = index["doc_terms"].pop(doc_id, None)
+    if term_counts is None:
+        return
+    index["version"] += 1
+
+    for term in term_counts:
+        postings = index["postings"][term]
+        postings.pop(doc_id, None)
+        if not postings:
+            del index["postings"][term]
+    index["total_length"] -= index["doc_lengths"].pop(doc_id)
+
+def update_lexical_index(collection_name, doc_id, content):
+    """
+    Add or replace a document in the BM25 index of a collection.
+
+    Should be called alongside every upsert into the matching ChromaDB collection so the
+    lexical and vector indexes stay in sync.
+
+    Args:
+        collection_name (str): The name of the ChromaDB collection.
+        doc_id (str): The ID of the document.
+        content (str): The document content.
+    """
+    remove_from_lexical_index(collection_name, doc_id)
+
+    index = get_lexical_index(collection_name)
+    term_counts = Counter(tokenize_code(content))
+    index["doc_terms"][doc_id] = term_counts
+    index["doc_lengths"][doc_id] = sum(term_counts.values())
+    index["total_length"] += index["doc_lengths"][doc_id]
+    index["version"] += 1
+    for term, count in term_counts.items():
+        index["postings"].setdefault(term, {})[doc_id] = count
+
+def bm25_search(collection_name, query, k=5, k1=1.5, b=0.75, doc_ids=None):
+    """
+    Rank the documents of a collection against a query using Okapi BM25.
+
+    Args:
+        collection_name (str): The name of the ChromaDB collection.
+        query (str): The search query.
+        k (int): The maximum number of results to return.
+        k1 (float): Term frequency saturation parameter.
+        b (float): Document length normalization parameter.
+        doc_ids (set): If given, only these documents are ranked.
 
-            if is_sensitive_content(file_content):
-                console.print(f"[bold red]Sensitive content detected in file: {file_path}. Please review before uploading.[/bold red]")
+    Returns:
+        list: Document IDs ordered from most to least relevant.
+    """
+    index = get_lexical_index(collection_name)
+    doc_count = len(index["doc_terms"])
+    if doc_count == 0:
+        return []
+    average_length = index["total_length"] / doc_count or 1
+
+    scores = Counter()
+    for term in set(tokenize_code(query)):
+        postings = index["postings"].get(term)
+        if not postings:
+            continue
+        idf = math.log(1 + (doc_count - len(postings) + 0.5) / (len(postings) + 0.5))
+        for doc_id, frequency in postings.items():
+            if doc_ids is not None and doc_id not in doc_ids:
                 continue
+            doc_length = index["doc_lengths"][doc_id]
+            norm = k1 * (1 - b + b * doc_length / average_length)
+            scores[doc_id] += idf * frequency * (k1 + 1) / (frequency + norm)
 
-            sanitized_content = sanitize_content(file_content)
-            file_id = generate_id(file_path)
+    return [doc_id for doc_id, _ in scores.most_common(k)]
 
-            # Create vector embedding
-            vector = vectorize_code(sanitized_content).tolist()
+def vector_search(collection, query_vector, k=5, doc_ids=None):
+    """
+    Rank the documents of a ChromaDB collection by embedding similarity to a query.
+
+    Args:
+        collection: The ChromaDB collection to search.
+        query_vector (numpy.ndarray): The query's embedding, see vectorize_code().
+        k (int): The maximum number of results to return.
+        doc_ids (set): If given, only these documents are ranked.
+
+    Returns:
+        list: Document IDs ordered from most to least similar.
+    """
+    if doc_ids is not None:
+        import numpy as np
+
+        # Rank the session's stored embeddings directly, a page at a time to bound memory
+        doc_ids = list(doc_ids)
+        nearest = []
+        for start in range(0, len(doc_ids), EMBEDDING_PAGE_SIZE):
+            stored = collection.get(ids=doc_ids[start:start + EMBEDDING_PAGE_SIZE], include=["embeddings"])
+            nearest = heapq.nsmallest(k, nearest + [
+                (float(np.linalg.norm(np.asarray(embedding) - query_vector)), doc_id)
+                for doc_id, embedding in zip(stored['ids'], stored['embeddings'])
+            ])
+        return [doc_id for _, doc_id in nearest]
+
+    n_results = min(k, collection.count())
+    if n_results == 0:
+        return []
+
+    results = collection.query(
+        query_embeddings=[query_vector.tolist()],
+        n_results=n_results,
+        include=[]
+    )
+    return results['ids'][0]
+
+def reciprocal_rank_fusion(rankings, k=60):
+    """
+    Fuse several ranked lists of document IDs with reciprocal-rank fusion.
+
+    Args:
+        rankings (list): A list of rankings, each a list of document IDs ordered by relevance.
+        k (int): The RRF smoothing constant.
+
+    Returns:
+        list: A list of (doc_id, score) tuples ordered by fused score.
+    """
+    scores = Counter()
+    for ranking in rankings:
+        for rank, doc_id in enumerate(ranking):
+            scores[doc_id] += 1 / (k + rank + 1)
+    return scores.most_common()
+
+def hybrid_search(query, k=5, collections=None, doc_ids=None, query_vector=None):
+    """
+    Search the stored files and URLs combining BM25 and embedding similarity.
+
+    Each collection is searched lexically and by vector, and all rankings are fused with
+    reciprocal-rank fusion so exact identifiers and semantic matches both surface.
+
+    Args:
+        query (str): The search query, e.g. a stack trace or issue description.
+        k (int): The maximum number of results to return.
+        collections (list): The ChromaDB collections to search. Defaults to files and URLs.
+        doc_ids (set): If given, only these documents are searched, e.g. those of one session.
+        query_vector (numpy.ndarray): The query's embedding, if already computed. Callers
+                                      holding index_lock should embed the query first.
+
+    Returns:
+        list: A list of dicts with 'id', 'document', 'metadata' and 'score' keys,
+              ordered from most to least relevant.
+    """
+    if collections is None:
+        collections = [files_collection, urls_collection]
+    if query_vector is None:
+        query_vector = vectorize_code(query)
+
+    # Retrieve more candidates than needed from each ranker so fusion has overlap to work with
+    candidate_count = k * 4
+    rankings = []
+    collection_by_id = {}
+    for collection in collections:
+        for ranking in (
+            bm25_search(collection.name, query, candidate_count, doc_ids=doc_ids),
+            vector_search(collection, query_vector, candidate_count, doc_ids),
+        ):
+            rankings.append(ranking)
+            for doc_id in ranking:
+                collection_by_id[doc_id] = collection
+
+    top = reciprocal_rank_fusion(rankings)[:k]
+
+    # Fetch the winners with one request per collection
+    stored_by_id = {}
+    for collection in collections:
+        top_ids = [doc_id for doc_id, _ in top if collection_by_id[doc_id] is collection]
+        if not top_ids:
+            continue
+        stored = collection.get(ids=top_ids, include=["documents", "metadatas"])
+        for doc_id, document, metadata in zip(stored['ids'], stored['documents'], stored['metadatas']):
+            stored_by_id[doc_id] = (document, metadata)
+
+    return [
+        {"id": doc_id, "document": stored_by_id[doc_id][0], "metadata": stored_by_id[doc_id][1], "score": score}
+        for doc_id, score in top if doc_id in stored_by_id
+    ]
 
-            # Perform the upsert for a single file
+def store_file_in_db(file_path):
+    """
+    Embed a single file and upsert it into the files collection.
+
+    Files whose content has not changed since they were last stored are skipped.
+
+    Args:
+        file_path (str): The path of the file.
+    """
+    try:
+        with open(file_path, 'r') as f:
+            file_content = f.read()
+
+        if is_sensitive_content(file_content):
+            print_background(f"[bold red]Sensitive content detected in file: {file_path}. Please review before uploading.[/bold red]")
+            return
+
+        sanitized_content = sanitize_content(file_content)
+        file_id = generate_id(file_path)
+
+        content_hash = hashlib.sha256(sanitized_content.encode()).hexdigest()
+        if indexed_file_hashes.get(file_id) == content_hash:
+            return
+
+        # Create vector embedding
+        vector = vectorize_code(sanitized_content).tolist()
+
+        # Perform the upsert for a single file
+        with index_lock:
             files_collection.upsert(
                 ids=[file_id],
                 documents=[sanitized_content],
                 metadatas=[{"path": file_path, "type": "file"}],
                 embeddings=[vector]
             )
+            update_lexical_index(files_collection.name, file_id, sanitized_content)
+            indexed_file_hashes[file_id] = content_hash
+
+    except Exception as e:
+        print_background(f"[bold red]Error processing file {file_path}: {str(e)}[/bold red]")
+
+def remove_file_from_db(file_path):
+    """
+    Remove a file from the files collection and its lexical index.
 
+    Args:
+        file_path (str): The path of the file.
+    """
+    file_id = generate_id(file_path)
+    with index_lock:
+        try:
+            files_collection.delete(ids=[file_id])
         except Exception as e:
-            console.print(f"[bold red]Error processing file {file_path}: {str(e)}[/bold red]")
+            print_background(f"[bold red]Error removing file {file_path}: {str(e)}[/bold red]")
+        remove_from_lexical_index(files_collection.name, file_id)
+        indexed_file_hashes.pop(file_id, None)
+
+def store_files_and_urls_in_db(files, urls):
+    """
+    Store the files and URLs in the ChromaDB database with unique IDs.
+
+    Args:
+        files (list): List of file paths.
+        urls (list): List of URLs.
+    """
+    # Process files
+    for file_path in files:
+        store_file_in_db(file_path)
 
     # Process URLs
     for url in urls:
         try:
-            response = requests.get(url)
+            response = http_session.get(url, timeout=SCRAPE_TIMEOUT)
             url_content = response.text
 
             if is_sensitive_content(url_content):
-                console.print(f"[bold red]Sensitive content detected in URL: {url}. Please review before uploading.[/bold red]")
+                print_background(f"[bold red]Sensitive content detected in URL: {url}. Please review before uploading.[/bold red]")
                 continue
 
             sanitized_content = sanitize_content(url_content)
@@ -500,41 +1270,274 @@ def store_files_and_urls_in_db(files, urls):
             vector = vectorize_code(sanitized_content).tolist()
 
             # Perform the upsert for a single URL
-            urls_collection.upsert(
-                ids=[url_id],
-                documents=[sanitized_content],
-                metadatas=[{"url": url, "type": "url"}],
-                embeddings=[vector]
-            )
+            with index_lock:
+                urls_collection.upsert(
+                    ids=[url_id],
+                    documents=[sanitized_content],
+                    metadatas=[{"url": url, "type": "url"}],
+                    embeddings=[vector]
+                )
+                update_lexical_index(urls_collection.name, url_id, sanitized_content)
 
         except Exception as e:
-            console.print(f"[bold red]Error processing URL {url}: {str(e)}[/bold red]")
+            print_background(f"[bold red]Error processing URL {url}: {str(e)}[/bold red]")
 
-def load_files_and_urls_from_db():
+class IndexUpdateHandler(FileSystemEventHandler):
     """
-    Load the files and URLs from the ChromaDB database and print their status.
+    Collects filesystem events for the watched files into the pending index updates.
+    """
+
+    def __init__(self, files):
+        super().__init__()
+        # Absolute path -> path as stored in the database, so document IDs stay stable
+        self.watched = {os.path.abspath(path): path for path in files}
+
+    def queue_update(self, path, action, dest_path=None):
+        with watch_state["condition"]:
+            watch_state["pending"][path] = action
+            if action == "moved":
+                watch_state["moves"][path] = dest_path
+            else:
+                watch_state["moves"].pop(path, None)
+            watch_state["last_event"] = time.monotonic()
+            watch_state["condition"].notify()
+
+    def on_created(self, event):
+        self.on_modified(event)
+
+    def on_modified(self, event):
+        path = self.watched.get(os.path.abspath(event.src_path))
+        if not event.is_directory and path:
+            self.queue_update(path, "upsert")
+
+    def on_deleted(self, event):
+        path = self.watched.get(os.path.abspath(event.src_path))
+        if not event.is_directory and path:
+            self.queue_update(path, "delete")
+
+    def on_moved(self, event):
+        if event.is_directory:
+            return
+        src_path = self.watched.get(os.path.abspath(event.src_path))
+        dest_path = self.watched.get(os.path.abspath(event.dest_path))
+        if dest_path:
+            # Editors often save by renaming a temporary file over the original
+            self.queue_update(dest_path, "upsert")
+        if src_path and not dest_path:
+            # Editors such as Emacs save by renaming the original to a backup and writing
+            # a new file, so whether to follow the rename is decided once events settle
+            self.queue_update(src_path, "moved", os.path.abspath(event.dest_path))
+        elif src_path:
+            self.queue_update(src_path, "delete")
+
+def follow_renamed_file(src_path, dest_path):
+    """
+    Watch a renamed file under its new path instead of the old one.
+
+    Args:
+        src_path (str): The path the file was stored under.
+        dest_path (str): The new absolute path.
+    """
+    with watch_state["condition"]:
+        handler = watch_state["handler"]
+        handler.watched.pop(os.path.abspath(src_path), None)
+        handler.watched[os.path.abspath(dest_path)] = dest_path
+        schedule_directories([dest_path])
+        for selection in watch_state["selections"].values():
+            if src_path in selection:
+                selection.discard(src_path)
+                selection.add(dest_path)
+
+def process_index_updates(debounce_seconds):
+    """
+    Background worker applying pending index updates once saves have settled.
+
+    Args:
+        debounce_seconds (float): How long no new events must arrive before updates are applied.
+    """
+    condition = watch_state["condition"]
+    while True:
+        with condition:
+            while not watch_state["pending"]:
+                watch_state["busy"] = False
+                condition.notify_all()
+                condition.wait()
+            watch_state["busy"] = True
+
+            # Wait for a burst of saves to go quiet before re-embedding
+            quiet_for = time.monotonic() - watch_state["last_event"]
+            if quiet_for < debounce_seconds:
+                condition.wait(debounce_seconds - quiet_for)
+                continue
+
+            pending = watch_state["pending"]
+            watch_state["pending"] = {}
+
+            moves = {path: watch_state["moves"].pop(path) for path in pending if path in watch_state["moves"]}
+
+        try:
+            for path, action in pending.items():
+                try:
+                    apply_index_update(path, action, moves.get(path))
+                except Exception as e:
+                    print_background(f"[bold red]Error updating index for {path}: {str(e)}[/bold red]")
+        finally:
+            # Never leave wait_for_index() blocked on a batch that failed
+            with condition:
+                watch_state["busy"] = False
+                condition.notify_all()
+
+def apply_index_update(path, action, dest_path=None):
+    """
+    Apply one debounced watcher event to the index.
+
+    Args:
+        path (str): The file the event was recorded for.
+        action (str): "upsert", "delete" or "moved".
+        dest_path (str): Where the file was moved to, for "moved" events.
+    """
+    if action == "moved" and not os.path.exists(path):
+        # The source did not come back, so this was a real rename
+        follow_renamed_file(path, dest_path)
+        remove_file_from_db(path)
+        store_file_in_db(dest_path)
+        print_background(f"[bold blue]Re-indexed renamed file:[/bold blue] {path} -> {dest_path}")
+    elif action == "delete" and not os.path.exists(path):
+        remove_file_from_db(path)
+        print_background(f"[bold blue]Removed from index:[/bold blue] {path}")
+    else:
+        store_file_in_db(path)
+        print_background(f"[bold blue]Re-indexed:[/bold blue] {path}")
+
+def start_file_watcher(files, debounce_seconds=1.0):
+    """
+    Index the selected files in the background and keep the index current as they change.
+
+    Changed files are re-embedded and upserted, deleted files are removed, and renamed
+    files are re-indexed under their new path.
+
+    Args:
+        files (list): List of file paths to watch. Calling again adds files to the watch.
+        debounce_seconds (float): How long to wait after the last save before re-indexing.
 
     Returns:
-        tuple: A tuple containing a list of file contents and a list of URL contents.
+        Observer: The running watchdog observer.
+    """
+    with watch_state["condition"]:
+        if watch_state["observer"] is None:
+            observer = Observer()
+            observer.daemon = True
+            observer.start()
+            watch_state["observer"] = observer
+            watch_state["handler"] = IndexUpdateHandler([])
+
+            worker = threading.Thread(target=process_index_updates, args=(debounce_seconds,), daemon=True)
+            worker.start()
+
+        observer = watch_state["observer"]
+        watch_state["handler"].watched.update((os.path.abspath(path), path) for path in files)
+        schedule_directories(files)
+
+        # Queue the initial indexing so it runs while the user answers the remaining prompts
+        for path in files:
+            watch_state["pending"].setdefault(path, "upsert")
+        watch_state["condition"].notify()
+    return observer
+
+def schedule_directories(files):
     """
-    # Use get() method to retrieve all documents
-    files = files_collection.get()
-    urls = urls_collection.get()
+    Start observing the directories of the files that are not observed yet.
 
-    # Extract contents from the results
-    file_contents = files.get('documents', []) if files else []
-    url_contents = urls.get('documents', []) if urls else []
+    Must be called with watch_state["condition"] held.
 
-    # Print the status of the files and URLs being loaded
-    console.print(f"[bold blue]Loading {len(file_contents)} files from the database...[/bold blue]")
-    for file in file_contents:
-        console.print(f"[bold green]Loaded file:[/bold green] {file[:100]}...")  # Print first 100 characters
+    Args:
+        files (list): List of file paths.
+    """
+    for directory in {os.path.dirname(os.path.abspath(path)) for path in files}:
+        if directory not in watch_state["directories"]:
+            watch_state["directories"][directory] = watch_state["observer"].schedule(
+                watch_state["handler"], directory, recursive=False
+            )
+
+def stop_watching_files(files):
+    """
+    Stop watching files and remove them from the index.
+
+    Args:
+        files (iterable): File paths as passed to start_file_watcher().
+    """
+    files = list(files)
+    if not files:
+        return
+
+    with watch_state["condition"]:
+        handler = watch_state["handler"]
+        for path in files:
+            handler.watched.pop(os.path.abspath(path), None)
+            watch_state["pending"].pop(path, None)
+            watch_state["moves"].pop(path, None)
 
-    console.print(f"[bold blue]Loading {len(url_contents)} URLs from the database...[/bold blue]")
-    for url in url_contents:
-        console.print(f"[bold green]Loaded URL content:[/bold green] {url[:100]}...")  # Print first 100 characters
+        # Stop observing directories that no longer contain a watched file
+        watched_directories = {os.path.dirname(path) for path in handler.watched}
+        for directory in list(watch_state["directories"]):
+            if directory not in watched_directories:
+                watch_state["observer"].unschedule(watch_state["directories"].pop(directory))
 
-    return file_contents, url_contents
+    for path in files:
+        remove_file_from_db(path)
+
+def wait_for_index():
+    """
+    Block until the file watcher has applied all pending index updates.
+    """
+    condition = watch_state["condition"]
+    with condition:
+        while watch_state["pending"] or watch_state["busy"]:
+            condition.wait()
+
+def documents_version():
+    """
+    Return a token that changes whenever a file or URL document is upserted or deleted.
+
+    Returns:
+        str: The version token.
+    """
+    return ":".join([
+        str(os.getpid()),
+        str(get_lexical_index(files_collection.name)["version"]),
+        str(get_lexical_index(urls_collection.name)["version"]),
+    ])
+
+def refresh_session_documents(session_documents, query, files, urls, files_k=CONTEXT_FILES_K, urls_k=CONTEXT_URLS_K):
+    """
+    Return the files and URLs most relevant to the query, searching only if the index changed.
+
+    Only the session's own files and URLs are searched, even when the index is shared
+    with other sessions through the daemon.
+
+    Args:
+        session_documents (dict): The session's cache, updated in place.
+        query (str): The search query, e.g. the context file contents.
+        files (list): The session's file paths.
+        urls (list): The session's URLs.
+        files_k (int): The maximum number of files to return.
+        urls_k (int): The maximum number of URLs to return.
+
+    Returns:
+        tuple: A tuple containing a list of file contents and a list of URL contents.
+    """
+    reply = call_resource(
+        "retrieve", query=query, files=files, urls=urls, files_k=files_k, urls_k=urls_k,
+        known_version=session_documents.get("version")
+    )
+    if not reply.get("unchanged"):
+        session_documents.update(reply)
+        console.print(f"[bold blue]Retrieved {len(reply['files'])} files and {len(reply['urls'])} URLs from the database[/bold blue]")
+        for source in reply["sources"]:
+            console.print(f"[bold green]Loaded:[/bold green] {source}")
+        for path in reply["omitted"]:
+            console.print(f"[bold yellow]Left out of the prompt as less relevant:[/bold yellow] {path}")
+    return session_documents["files"], session_documents["urls"]
 
 def resolve_conflicts(personas, api_key, file_paths, context_file, max_rounds=10):
     """
@@ -556,21 +1559,29 @@ def resolve_conflicts(personas, api_key, file_paths, context_file, max_rounds=10
 
     # Store files and URLs in the database
     urls = [line.strip() for line in context_contents.splitlines() if line.startswith("http")]
-    store_files_and_urls_in_db(file_paths, urls)
+    call_resource("index", files=file_paths, urls=urls)
+
+    # Personas and process instructions stay fixed for the whole session
+    perspectives = "\n".join([f"[bold]{persona['role']}[/bold] ({persona['background']}): {persona['perspective']}" for persona in personas])
+    system_prompt = (
+        f"The following personas have conflicting perspectives:\n"
+        f"{perspectives}\n\n"
+        f"{CONFLICT_RESOLUTION_PROCESS}"
+    )
 
+    session_documents = {}
     for round in range(max_rounds):
         console.print(f"[bold blue]Conflict Resolution Round {round + 1}[/bold blue]")
-        perspectives = "\n".join([f"[bold]{persona['role']}[/bold] ({persona['background']}): {persona['perspective']}" for persona in personas])
 
-        # Reload the files and URLs from the database on each new run
-        file_contents, url_contents = load_files_and_urls_from_db()
+        # Retrieve the most relevant files and URLs, again only if the index changed
+        file_contents, url_contents = refresh_session_documents(session_documents, context_contents, file_paths, urls)
 
         # Combine all file contents into one string
         all_files_contents = "\n".join(file_contents)
         all_urls_contents = "\n".join(url_contents)
 
         # Construct the focus_files string with the file contents and context
-        focus_files_str = (
+        prompt = (
             "Focusing on the following files:\n"
             f"{all_files_contents}\n"
             f"Context from {context_file}:\n"
@@ -580,44 +1591,8 @@ def resolve_conflicts(personas, api_key, file_paths, context_file, max_rounds=10
             "Please provide a supportive response that captures the essence of this process.\n\n"
         )
 
-        # Now integrate that into the content string, using an f-string to interpolate the variable
-        prompt = (
-            f"The following personas have conflicting perspectives:\n"
-            f"{perspectives}\n\n"
-            f"David, as the leader, guides the team through a step-by-step process to resolve the issue "
-            f"in the given context file. The goal is to foster collaboration among the team members, "
-            f"ensuring clarity and structure, and allowing for a consensus on a technical solution that "
-            f"addresses all perspectives. The process is:\n\n"
-            f"1) Gather All Perspectives: David summarizes each persona's viewpoint.\n"
-            f"2) Identify the Core Issue: Examine the context file to determine the root cause.\n"
-            f"3) Brainstorm Solutions: Team members offer potential solutions.\n"
-            f"4) Discuss and Refine: Collaborate and refine the ideas.\n"
-            f"5) Reach Consensus: Arrive at a balanced, feasible technical solution.\n"
-            f"6) Record the Action Plan: Document the steps everyone agrees to.\n\n"
-            f"7) Display Sudo Code and steps to resolve the issue.\n\n"
-            f"{focus_files_str}"
-            f"Please provide a structured, supportive response guiding the team through these steps."
-        )
-
-        payload = {
-            "model": "llama3-8b-8192",
-            "messages": [{"role": "user", "content": prompt}]
-        }
-
-        headers = {
-            "Authorization": f"Bearer {api_key}",
-            "Content-Type": "application/json"
-        }
-
-        response = requests.post(
-            "https://api.groq.com/openai/v1/chat/completions",
-            headers=headers,
-            data=json.dumps(payload)
-        )
-
-        response.raise_for_status()
-
-        response_json = response.json()
+        history = []
+        response_json = post_chat_completion(build_messages(system_prompt, prompt), api_key, "consensus")
         aider_response = response_json['choices'][0]['message']['content']
         console.print(f"[bold green]Assistant's Response:[/bold green] {aider_response}")
 
@@ -625,29 +1600,487 @@ def resolve_conflicts(personas, api_key, file_paths, context_file, max_rounds=10
             console.print(f"[bold]{persona['role']}[/bold] ({persona['background']}): {persona['perspective']}")
 
         while True:
-            user_input = Prompt.ask("[bold yellow]Your response (or type 'exit' to end)[/bold yellow]")
+            hold_background_output()
+            try:
+                user_input = Prompt.ask("[bold yellow]Your response (or type 'exit' to end)[/bold yellow]")
+            finally:
+                release_background_output()
             if user_input.lower() == "exit":
                 console.print("[bold red]Exiting chat.[/bold red]")
                 return aider_response
 
-            prompt += f"\nUser: {user_input}"
+            # Append turns instead of rewriting the prompt so earlier turns remain a shared prefix
+            history += [
+                {"role": "user", "content": prompt},
+                {"role": "assistant", "content": aider_response},
+            ]
+            prompt = user_input
+
+            response_json = post_chat_completion(build_messages(system_prompt, prompt, history), api_key, "consensus")
+            aider_response = response_json['choices'][0]['message']['content']
+            console.print(f"[bold green]Assistant's Response:[/bold green] {aider_response}")
+
+def resolve_paths(paths, cwd=None):
+    """
+    Resolve file paths relative to the caller's working directory.
+
+    Args:
+        paths (list): List of file paths.
+        cwd (str): The caller's working directory. Defaults to the current one.
+
+    Returns:
+        list: Normalized absolute file paths.
+    """
+    return [os.path.normpath(os.path.join(cwd or os.getcwd(), path)) for path in paths]
+
+def handle_embed(content):
+    """Return the CodeBERT embedding of the content as a list."""
+    return vectorize_code(content).tolist()
+
+def session_files(files, cwd=None, session_id=None):
+    """
+    Return a session's files as the daemon currently sees them.
+
+    Once a session has called 'watch', its server-side selection is used, which follows
+    renames the watcher has applied since the client chose its files.
+    """
+    with watch_state["condition"]:
+        selection = watch_state["selections"].get(session_id)
+        if selection is not None:
+            return sorted(selection)
+    return resolve_paths(files, cwd)
+
+def handle_index(files, urls, cwd=None, session_id=None):
+    """Store the files and URLs, waiting for any pending watcher updates first."""
+    load_resources()
+    wait_for_index()
+    store_files_and_urls_in_db(session_files(files, cwd, session_id), urls)
+
+def is_process_alive(pid):
+    """Check whether a process with the given ID is still running."""
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+def handle_watch(files, session_id, pid, cwd=None):
+    """
+    Watch the files selected in a client session, replacing the session's previous selection.
+
+    Sessions whose client process has exited are dropped, and files that no live session
+    selects any more are unwatched and removed from the index.
+    """
+    load_resources()
+    files = resolve_paths(files, cwd)
+    with watch_state["condition"]:
+        previously_selected = set().union(*watch_state["selections"].values())
+        watch_state["selections"][session_id] = set(files)
+        watch_state["session_pids"][session_id] = pid
+        for other_id, other_pid in list(watch_state["session_pids"].items()):
+            if not is_process_alive(other_pid):
+                del watch_state["session_pids"][other_id]
+                watch_state["selections"].pop(other_id, None)
+        still_selected = set().union(*watch_state["selections"].values())
+    stop_watching_files(previously_selected - still_selected)
+    start_file_watcher(files)
+
+def handle_end_session(session_id):
+    """Drop a client session's selection, unwatching files no other session selects."""
+    with watch_state["condition"]:
+        watch_state["session_pids"].pop(session_id, None)
+        selection = watch_state["selections"].pop(session_id, set())
+        still_selected = set().union(*watch_state["selections"].values())
+    if watch_state["handler"]:
+        stop_watching_files(selection - still_selected)
+
+def session_doc_ids(files, urls, cwd=None, session_id=None):
+    """Return the document IDs of a session's files and URLs."""
+    return {generate_id(path) for path in session_files(files, cwd, session_id)} | {generate_id(url) for url in urls}
+
+def handle_retrieve(query, files, urls, files_k=CONTEXT_FILES_K, urls_k=CONTEXT_URLS_K, known_version=None,
+                    cwd=None, session_id=None):
+    """
+    Return the session's most relevant file and URL contents, unless the caller's copy is current.
+
+    The reply also lists the session's files that did not make the cut.
+    """
+    load_resources()
+    if documents_version() == known_version:
+        return {"version": known_version, "unchanged": True}
+
+    # Embed outside the lock so other sessions' searches and index updates are not held up
+    query_vector = vectorize_code(query)
+    selected_files = session_files(files, cwd, session_id)
+    doc_ids = {generate_id(path) for path in selected_files} | {generate_id(url) for url in urls}
+    with index_lock:
+        version = documents_version()
+        file_results = hybrid_search(query, files_k, [files_collection], doc_ids, query_vector)
+        url_results = hybrid_search(query, urls_k, [urls_collection], doc_ids, query_vector)
+    retrieved_paths = {result['metadata'].get('path') for result in file_results}
+    return {
+        "version": version,
+        "files": [result['document'] for result in file_results],
+        "urls": [result['document'] for result in url_results],
+        "sources": [result['metadata'].get('path') for result in file_results]
+                   + [result['metadata'].get('url') for result in url_results],
+        "omitted": [path for path in selected_files if path not in retrieved_paths],
+    }
+
+def handle_search(query, files, urls, k=5, collection_names=None, cwd=None, session_id=None):
+    """Run a hybrid search over the session's documents in the named collections."""
+    load_resources()
+    collections_by_name = {"files": files_collection, "urls": urls_collection}
+    collections = [collections_by_name[name] for name in collection_names or collections_by_name]
+    query_vector = vectorize_code(query)
+    with index_lock:
+        return hybrid_search(query, k, collections, session_doc_ids(files, urls, cwd, session_id), query_vector)
+
+def handle_chat(messages, model):
+    """Send a chat completion request using the daemon's own API key."""
+    return request_chat_completion(messages, os.getenv("GROQ_API_KEY"), model)
+
+# Operations served by the daemon, and run in-process when no daemon is available
+RESOURCE_OPERATIONS = {
+    "ping": lambda: "pong",
+    "embed": handle_embed,
+    "index": handle_index,
+    "watch": handle_watch,
+    "end_session": handle_end_session,
+    "retrieve": handle_retrieve,
+    "search": handle_search,
+    "chat": handle_chat,
+}
+
+class DaemonRequestHandler(socketserver.StreamRequestHandler):
+    """
+    Serves newline-delimited JSON requests of the form {"op": ..., "params": {...}}.
+    """
+
+    def handle(self):
+        for line in self.rfile:
+            try:
+                request = json.loads(line)
+                operation = RESOURCE_OPERATIONS[request["op"]]
+                reply = {"result": operation(**request.get("params", {}))}
+            except requests.exceptions.HTTPError as e:
+                reply = {"error": str(e), "type": "http"}
+            except Exception as e:
+                reply = {"error": f"{type(e).__name__}: {e}"}
+            self.wfile.write((json.dumps(reply) + "\n").encode())
+
+def send_daemon_request(socket_path, op, **params):
+    """
+    Send one request to the daemon and return its result.
+
+    Args:
+        socket_path (str): The daemon's Unix domain socket.
+        op (str): The operation name, see RESOURCE_OPERATIONS.
+        **params: The operation's keyword arguments.
+
+    Returns:
+        The operation's result.
+
+    Raises:
+        OSError: If the daemon cannot be reached or stops before replying.
+        requests.exceptions.HTTPError: If the daemon's API request failed.
+        RuntimeError: If the operation failed in the daemon.
+    """
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as client:
+        client.connect(socket_path)
+        with client.makefile("rwb") as stream:
+            stream.write((json.dumps({"op": op, "params": params}) + "\n").encode())
+            stream.flush()
+            line = stream.readline()
+    if not line:
+        raise ConnectionError(f"The daemon closed the connection without replying to '{op}'")
+    reply = json.loads(line)
+
+    if "error" in reply:
+        if reply.get("type") == "http":
+            raise requests.exceptions.HTTPError(reply["error"])
+        raise RuntimeError(f"Daemon operation '{op}' failed: {reply['error']}")
+    return reply["result"]
+
+def default_daemon_socket_path():
+    """
+    Return the daemon socket path inside a directory private to the current user.
+
+    Uses $XDG_RUNTIME_DIR when set, otherwise a per-user subdirectory of the temp directory.
+
+    Returns:
+        str: The socket path.
+    """
+    if DAEMON_SOCKET_PATH:
+        return DAEMON_SOCKET_PATH
+    directory = os.getenv("XDG_RUNTIME_DIR") or os.path.join(
+        tempfile.gettempdir(), f"groq-code-assistant-{os.getuid()}"
+    )
+    return os.path.join(directory, "groq-code-assistant.sock")
+
+def is_private_path(path):
+    """
+    Check that a path is owned by the current user and not writable by anyone else.
+
+    Args:
+        path (str): The path to check. Symlinks are not followed.
+
+    Returns:
+        bool: True if the path is private to the current user.
+    """
+    path_stat = os.lstat(path)
+    return path_stat.st_uid == os.getuid() and not path_stat.st_mode & (stat.S_IWGRP | stat.S_IWOTH)
+
+def is_private_socket(socket_path):
+    """
+    Check that a daemon socket and its directory belong to the current user only.
 
-            payload = {
-                "model": "llama3-8b-8192",
-                "messages": [{"role": "user", "content": prompt}]
-            }
+    Args:
+        socket_path (str): The socket path.
+
+    Returns:
+        bool: True if the socket is safe to connect to.
+    """
+    try:
+        return (
+            stat.S_ISSOCK(os.lstat(socket_path).st_mode)
+            and is_private_path(socket_path)
+            and is_private_path(os.path.dirname(os.path.abspath(socket_path)))
+        )
+    except OSError:
+        return False
+
+def connect_daemon(socket_path=None):
+    """
+    Route resource operations through the daemon if one is listening.
 
-            response = requests.post(
-                "https://api.groq.com/openai/v1/chat/completions",
-                headers=headers,
-                data=json.dumps(payload)
+    Only sockets owned by the current user, in a directory no one else can write to, are
+    used, so another local user cannot impersonate the daemon.
+
+    Args:
+        socket_path (str): The daemon's Unix domain socket. Defaults to default_daemon_socket_path().
+
+    Returns:
+        bool: True if a daemon answered, False if operations will run in-process.
+    """
+    if not hasattr(socket, "AF_UNIX") or not hasattr(os, "getuid"):
+        return False
+    socket_path = socket_path or default_daemon_socket_path()
+    if not os.path.exists(socket_path):
+        return False
+    if not is_private_socket(socket_path):
+        console.print(f"[bold red]Ignoring daemon socket {socket_path}: it is not private to the current user.[/bold red]")
+        return False
+    try:
+        send_daemon_request(socket_path, "ping")
+    except OSError:
+        return False
+    daemon_state["socket_path"] = socket_path
+    console.print(f"[bold blue]Using assistant daemon at {socket_path}[/bold blue]")
+    return True
+
+def call_resource(op, **params):
+    """
+    Run a resource operation in the daemon when connected, otherwise in-process.
+
+    If the daemon goes away, the session continues in-process: the last file selection is
+    watched and indexed locally before the operation is retried.
+
+    Args:
+        op (str): The operation name, see RESOURCE_OPERATIONS.
+        **params: The operation's keyword arguments.
+
+    Returns:
+        The operation's result, as decoded JSON when it came from the daemon.
+    """
+    if op in ("index", "watch", "search", "retrieve"):
+        params["cwd"] = os.getcwd()
+    if op in ("index", "watch", "search", "retrieve", "end_session"):
+        params["session_id"] = daemon_state["session_id"]
+    if op == "watch":
+        params["pid"] = os.getpid()
+        daemon_state["watch_params"] = params
+
+    if daemon_state["socket_path"]:
+        try:
+            return send_daemon_request(daemon_state["socket_path"], op, **params)
+        except OSError as e:
+            console.print(f"[bold red]Lost the assistant daemon ({e}), continuing in-process.[/bold red]")
+            daemon_state["socket_path"] = None
+            if op not in ("watch", "end_session") and daemon_state.get("watch_params"):
+                RESOURCE_OPERATIONS["watch"](**daemon_state["watch_params"])
+                wait_for_index()
+    return RESOURCE_OPERATIONS[op](**params)
+
+def serve_daemon(socket_path=None):
+    """
+    Run the resident daemon, keeping the model, vector store and caches warm.
+
+    Args:
+        socket_path (str): The Unix domain socket to listen on. Defaults to default_daemon_socket_path().
+    """
+    # Chat requests use the daemon's own key; clients never send theirs
+    ensure_api_key()
+
+    socket_path = socket_path or default_daemon_socket_path()
+    socket_directory = os.path.dirname(os.path.abspath(socket_path))
+    os.makedirs(socket_directory, mode=0o700, exist_ok=True)
+    if not is_private_path(socket_directory):
+        print(f"Error: {socket_directory} must be owned by you and not writable by others.")
+        exit(1)
+
+    if os.path.exists(socket_path):
+        if not is_private_socket(socket_path):
+            print(f"Error: {socket_path} exists and is not a socket private to the current user.")
+            exit(1)
+        try:
+            send_daemon_request(socket_path, "ping")
+            print(f"Error: A daemon is already listening on {socket_path}.")
+            exit(1)
+        except OSError:
+            # Left behind by a daemon that did not shut down cleanly
+            os.remove(socket_path)
+
+    console.print("[bold blue]Loading model and vector store...[/bold blue]")
+    load_resources()
+
+    # Create the socket readable and writable by the current user only
+    previous_umask = os.umask(0o177)
+    try:
+        server = socketserver.ThreadingUnixStreamServer(socket_path, DaemonRequestHandler)
+    finally:
+        os.umask(previous_umask)
+    server.daemon_threads = True
+    console.print(f"[bold green]Daemon listening on {socket_path}[/bold green]")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        console.print("[bold red]Shutting down daemon.[/bold red]")
+    finally:
+        server.server_close()
+        os.remove(socket_path)
+
+def run_stage_graph(stages, max_workers=4):
+    """
+    Run a dependency graph of stages, overlapping independent work.
+
+    Background stages run on a thread pool as soon as their dependencies are done, which
+    suits the blocking HTTP calls and the CodeBERT inference (torch releases the GIL).
+    Interactive stages run on the calling thread, one at a time in declaration order, so
+    prompts never interleave. Each stage runs exactly once and its result is shared by
+    every stage that depends on it.
+
+    Args:
+        stages (dict): Maps stage names to dicts with a 'run' callable, an optional 'deps'
+                       list of stage names whose results are passed to 'run' positionally,
+                       an optional 'interactive' flag and an optional 'default'. A
+                       background stage with a 'default' is non-critical: if it fails,
+                       the error is reported and the default is used as its result.
+        max_workers (int): The maximum number of background stages running at once.
+
+    Returns:
+        dict: The result of every stage, keyed by stage name.
+
+    Raises:
+        ValueError: If a stage depends on an unknown stage or the graph has a cycle.
+        Exception: The error of a failed stage without a 'default'.
+    """
+    for name, stage in stages.items():
+        unknown = set(stage.get("deps", [])) - set(stages)
+        if unknown:
+            raise ValueError(f"Stage '{name}' depends on unknown stages: {', '.join(sorted(unknown))}")
+
+    results = {}
+    pending = dict(stages)
+    running = {}
+
+    def is_ready(stage):
+        return all(dep in results for dep in stage.get("deps", []))
+
+    def dep_results(stage):
+        return [results[dep] for dep in stage.get("deps", [])]
+
+    pool = ThreadPoolExecutor(max_workers=max_workers)
+    try:
+        while pending or running:
+            for name, future in list(running.items()):
+                if not future.done():
+                    continue
+                del running[name]
+                try:
+                    results[name] = future.result()
+                except Exception as e:
+                    if "default" not in stages[name]:
+                        raise
+                    console.print(f"[bold red]Stage '{name}' failed, continuing without it: {e}[/bold red]")
+                    results[name] = stages[name]["default"]
+
+            for name, stage in list(pending.items()):
+                if not stage.get("interactive") and is_ready(stage):
+                    running[name] = pool.submit(stage["run"], *dep_results(stage))
+                    del pending[name]
+
+            interactive = next(
+                (name for name, stage in pending.items() if stage.get("interactive") and is_ready(stage)),
+                None
             )
+            if interactive:
+                stage = pending.pop(interactive)
+                # Background stages keep running, so hold their output until the prompt is answered
+                hold_background_output()
+                try:
+                    results[interactive] = stage["run"](*dep_results(stage))
+                finally:
+                    release_background_output()
+            elif running:
+                wait(running.values(), return_when=FIRST_COMPLETED)
+            elif pending:
+                raise ValueError(f"Stages have circular dependencies: {', '.join(pending)}")
+    except BaseException:
+        # Do not wait for stages still running, e.g. HTTP calls, when a stage has failed
+        pool.shutdown(wait=False, cancel_futures=True)
+        raise
+    pool.shutdown()
+
+    return results
+
+def scrape_context_urls(context):
+    """
+    Append the scraped content of the first URL in the context, if any.
 
-            response.raise_for_status()
+    Args:
+        context (str): The context file contents.
 
-            response_json = response.json()
-            aider_response = response_json['choices'][0]['message']['content']
-            console.print(f"[bold green]Assistant's Response:[/bold green] {aider_response}")
+    Returns:
+        str: The context, extended with the scraped URL content.
+    """
+    # Extract URL from context and scrape content
+    url = None
+    for line in context.splitlines():
+        if (line.startswith("http")):
+            url = line.strip()
+            break
+
+    if url:
+        url_content = scrape_url_content(url)
+        context += f"\n\nScraped Content from URL:\n{url_content}"
+    return context
+
+def ask_update_conventions():
+    """
+    Ask whether to regenerate CONVENTIONS.md when it already exists.
+
+    Returns:
+        bool: True if CONVENTIONS.md should be generated.
+    """
+    if not os.path.isfile("CONVENTIONS.md"):
+        return True
+    return questionary.confirm(
+        message="CONVENTIONS.md already exists. Would you like to update it?",
+        default=True
+    ).ask()
 
 def main():
     """
@@ -655,20 +2088,26 @@ def main():
 
     This function performs the following steps:
     1. Ensures the API key is available.
-    2. Prompts the user to select an action, focus, and subject from predefined lists.
-    3. Reads context information from a file named 'context.txt'.
-    4. Prompts the user to specify file paths.
+    2. Reads context information from a file named 'context.txt'.
+    3. Prompts the user to select an action, focus, and subject from predefined lists,
+       the files, the sensitive files and the intent of the change. URL scraping, file
+       indexing and CONVENTIONS.md generation run in the background meanwhile, see
+       run_stage_graph().
+    4. Resolves conflicts between the personas.
     5. Constructs an initial prompt using the selected options and context information.
     6. Writes the initial prompt to a file named 'initial_prompt.md'.
     7. Sends the initial prompt to an assistant and handles the assistant's replies in a loop.
         - If the assistant's reply ends with a question mark, prompts the user for a response.
         - Appends the user's response to the initial prompt and sends it to the assistant again.
         - Exits the loop if the user types 'exit' or if the assistant has no further questions.
+    8. Asks Aider about the issue in the context file, then about any follow-up issues
+       the user describes, reusing one Aider session.
 
     Raises:
          SystemExit: If the context file 'context.txt' does not exist.
     """
     ensure_api_key()
+    connect_daemon()
     actions = [
         "Implement", "Debug", "Optimize", "Refactor", "Review",
         "Integrate", "Document", "Test", "Deploy"
@@ -683,15 +2122,11 @@ def main():
         "Django", "Flask", "TensorFlow", "Vue.js", "Ansible", "Vite"
     ]
 
-    action = select_option("Select an action", actions)
-    focus = select_option("Select a focus", focuses)
-    subject = select_option("Select a subject", subjects)
-
     context_file = "context.txt"
 
     if os.path.isfile(context_file):
         with open(context_file, "r") as f:
-            context = f.read()
+            raw_context = f.read()
     else:
         print(f"The context file '{context_file}' does not exist.")
         print("Please create the file with the necessary context information.")
@@ -700,21 +2135,6 @@ def main():
         print("After creating the file, run this script again.")
         exit(1)
 
-    # Extract URL from context and scrape content
-    url = None
-    for line in context.splitlines():
-        if (line.startswith("http")):
-            url = line.strip()
-            break
-
-    if url:
-        url_content = scrape_url_content(url)
-        context += f"\n\nScraped Content from URL:\n{url_content}"
-
-    file_paths = prompt_for_files()
-    sensitive_files = prompt_for_sensitive_files()
-    detailed_prompt = generate_detailed_prompt(action, focus, subject, context)
-
     personas = [
     {
         "role": "Senior Developer",
@@ -759,18 +2179,53 @@ def main():
     ]
 
     api_key = os.getenv("GROQ_API_KEY")
-    resolved_conflicts = resolve_conflicts(personas, api_key, file_paths, context_file)
-    detailed_prompt = generate_detailed_prompt(action, focus, subject, context)
-
-    # Generic pseudoscript outlining best software development steps
-    pseudoscript = (
-        "1. **Planning**: Define the project scope, objectives, and requirements.\n"
-        "2. **Design**: Create architectural and detailed design documents.\n"
-        "3. **Development**: Implement the design using {subject}.\n"
-        "4. **Testing**: Develop and execute test cases to ensure functionality.\n"
-        "5. **Deployment**: Deploy the system to the target environment.\n"
-        "6. **Maintenance**: Monitor and maintain the system post-deployment."
-        "Please follow the Best Software Development Steps outlined above."
+
+    # Interactive stages run in order on this thread; the rest overlap with them
+    stages = {
+        "action": {"run": lambda: select_option("Select an action", actions), "interactive": True},
+        "focus": {"run": lambda: select_option("Select a focus", focuses), "interactive": True},
+        "subject": {"run": lambda: select_option("Select a subject", subjects), "interactive": True},
+        "context": {"run": lambda: scrape_context_urls(raw_context), "default": raw_context},
+        "file_paths": {"run": prompt_for_files, "interactive": True},
+        "index": {
+            "run": lambda file_paths: call_resource("watch", files=file_paths),
+            "deps": ["file_paths"],
+        },
+        "sensitive_files": {"run": prompt_for_sensitive_files, "interactive": True},
+        "intent": {
+            "run": lambda: input("What is the intent or goal of this change? "),
+            "interactive": True,
+        },
+        "update_conventions": {"run": ask_update_conventions, "interactive": True},
+        "conventions": {
+            "run": lambda action, focus, subject, intent, update: update and generate_conventions_md(
+                f"Action: {action}, Focus: {focus}, Subject: {subject}", intent
+            ),
+            "deps": ["action", "focus", "subject", "intent", "update_conventions"],
+            "default": None,
+        },
+        "resolved_conflicts": {
+            "run": lambda file_paths, index: resolve_conflicts(personas, api_key, file_paths, context_file),
+            "deps": ["file_paths", "index"],
+            "interactive": True,
+        },
+        "detailed_prompt": {
+            "run": generate_detailed_prompt,
+            "deps": ["action", "focus", "subject", "context"],
+        },
+    }
+    results = run_stage_graph(stages)
+    action, focus, subject = results["action"], results["focus"], results["subject"]
+    context = results["context"]
+    file_paths = results["file_paths"]
+    sensitive_files = results["sensitive_files"]
+    detailed_prompt = results["detailed_prompt"]
+    resolved_conflicts = results["resolved_conflicts"]
+
+    # Static instructions go first so every session shares the same prompt prefix
+    system_prompt = (
+        f"Personas:\n{personas}\n"
+        f"Please follow the Best Software Development Steps outlined below and incorporate the perspectives of the personas provided.:\n{PSEUDOSCRIPT}\n"
     )
 
     # Include the detailed prompt in the initial_prompt
@@ -780,27 +2235,15 @@ def main():
         f"Subject: {subject}\n"
         f"Sensitive Files: {', '.join(sensitive_files)}\n"
         f"Detailed Prompt:\n{detailed_prompt}\n"
-        f"Personas:\n{personas}\n"
         f"Resolved Conflicts:\n{resolved_conflicts}\n"
-        f"Please follow the Best Software Development Steps outlined above and incorporate the perspectives of the personas provided.:\n{pseudoscript}\n"
     )
 
     with open("initial_prompt.md", "w") as f:
-        f.write(initial_prompt)
-
-    intent = input("What is the intent or goal of this change? ")
-
-    if os.path.isfile("CONVENTIONS.md"):
-        update_conventions = questionary.confirm(
-            message="CONVENTIONS.md already exists. Would you like to update it?",
-            default=True
-        ).ask()
-        if update_conventions:
-            generate_conventions_md(f"Action: {action}, Focus: {focus}, Subject: {subject}", intent)
-    else:
-        generate_conventions_md(f"Action: {action}, Focus: {focus}, Subject: {subject}", intent)
+        f.write(f"{system_prompt}\n{initial_prompt}")
 
-    assistant_reply = send_message(initial_prompt, os.getenv("GROQ_API_KEY"))
+    history = []
+    user_message = initial_prompt
+    assistant_reply = send_message(user_message, os.getenv("GROQ_API_KEY"), system_prompt)
 
     while True:
         if assistant_reply.strip().endswith("?"):
@@ -812,9 +2255,14 @@ def main():
             initial_prompt += f"\nUser: {user_input}"
 
             with open("initial_prompt.md", "w") as f:
-                f.write(initial_prompt)
-
-            assistant_reply = send_message(initial_prompt, os.getenv("GROQ_API_KEY"))
+                f.write(f"{system_prompt}\n{initial_prompt}")
+
+            history += [
+                {"role": "user", "content": user_message},
+                {"role": "assistant", "content": assistant_reply},
+            ]
+            user_message = user_input
+            assistant_reply = send_message(user_message, os.getenv("GROQ_API_KEY"), system_prompt, history)
         else:
             print("No further questions from the assistant. Exiting chat.")
             break
@@ -826,7 +2274,35 @@ def main():
     aider_response = ask_aider_about_issue(issue_description, file_paths)
     print(f"Aider's Response: {aider_response}")
 
+    # Follow-up issues reuse the same Aider session, skipping its cold start
+    while True:
+        hold_background_output()
+        try:
+            issue_description = Prompt.ask("[bold yellow]Describe another issue for Aider (or type 'exit' to end)[/bold yellow]")
+        finally:
+            release_background_output()
+        if issue_description.lower() == "exit":
+            break
+        aider_response = ask_aider_about_issue(issue_description, file_paths)
+        print(f"Aider's Response: {aider_response}")
+
+    call_resource("end_session")
+    report_prefix_reuse()
+    report_model_latencies()
+
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Automated Code Development Assistant")
+    parser.add_argument("--daemon", action="store_true",
+                        help="run the resident daemon that keeps the model and index loaded")
+    parser.add_argument("--socket", default=DAEMON_SOCKET_PATH,
+                        help="Unix domain socket of the daemon, in a directory private to you")
+    args = parser.parse_args()
+    DAEMON_SOCKET_PATH = args.socket
+
+    if args.daemon:
+        serve_daemon(args.socket)
+        sys.exit(0)
+
     main()
     print("\nPlease manually review the generated files before proceeding.")
     print("Note: This script is still in development. Contributions are welcome!")